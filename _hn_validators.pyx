@@ -0,0 +1,35 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""Compiled fast path for validate_hn_freight_matrix_file.
+
+Build in place with: cythonize -i _hn_validators.pyx
+"""
+from cpython.conversion cimport PyOS_string_to_double
+from cpython.unicode cimport PyUnicode_AsUTF8AndSize
+from libc.math cimport isinf
+
+cdef unsigned char SKU_OK[256]
+cdef int _c
+for _c in range(256):
+    SKU_OK[_c] = (48 <= _c <= 57) or (65 <= _c <= 90) or (97 <= _c <= 122) or _c in (45, 46, 47, 95)
+
+def validate_row(str sku, str pc, str price) -> float:
+    """Return the parsed price when all three raw fields are clean ASCII, else -1.0 so the caller re-validates in Python."""
+    cdef Py_ssize_t n, i, digits = 0, dots = 0
+    cdef const char* p = PyUnicode_AsUTF8AndSize(sku, &n)
+    cdef double val
+    if n == 0 or n > 64: return -1.0
+    for i in range(n):
+        if not SKU_OK[<unsigned char>p[i]]: return -1.0
+    p = PyUnicode_AsUTF8AndSize(pc, &n)
+    if n != 4: return -1.0
+    for i in range(4):
+        if p[i] < 48 or p[i] > 57: return -1.0
+    p = PyUnicode_AsUTF8AndSize(price, &n)
+    for i in range(n):
+        if 48 <= p[i] <= 57: digits += 1
+        elif p[i] == 46 and dots == 0: dots = 1
+        else: return -1.0
+    if digits == 0: return -1.0
+    val = PyOS_string_to_double(p, NULL, NULL)
+    if isinf(val): return -1.0
+    return val
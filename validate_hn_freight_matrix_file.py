@@ -1,21 +1,53 @@
 from __future__ import annotations
-import os, csv, json, math, platform, subprocess
-from collections import defaultdict
-from statistics import mean
+import os, io, re, csv, gzip, json, math, heapq, mmap, queue, platform, string, subprocess, threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby, islice
+from operator import itemgetter
+from array import array
+from copy import deepcopy
 from datetime import datetime
+from decimal import Decimal
 from typing import Any, Mapping, Optional
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from ttkbootstrap import Style
 from ttkbootstrap.constants import PRIMARY, INFO, SUCCESS
+try:
+    import numpy as np
+except ImportError:
+    np = None
+try:
+    import pyarrow as pa, pyarrow.csv as pa_csv, pyarrow.compute as pa_compute
+except ImportError:
+    pa = None
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ijson
+except ImportError:
+    ijson = None
+try:
+    import liburing
+except ImportError:
+    liburing = None
+try:
+    from _hn_validators import validate_row as fast_validate_row
+except ImportError:
+    fast_validate_row = None
 APP_DIR = os.path.join(os.path.expanduser("~"), ".csvjson_app")
 CONFIG_PATH = os.path.join(APP_DIR, "validate_hn_freight_matrix_app_settings.json")
+DEFAULT_FILENAME_PATTERN = "{base}_{batch}_{group}_{ts}.{ext}"
 DEFAULT_SETTINGS = {
     "export": {
         "folder": os.path.abspath("export"),
         "open_folder_after": True,
-        "filename_pattern": "{base}_{batch}_{group}_{ts}.{ext}",
+        "filename_pattern": DEFAULT_FILENAME_PATTERN,
         "formats": {"csv": False, "json": True},
+        "compress": False,
+        "json_indent": False,
+        "mmap": False,
     },
     "batch": {
         "enabled": True,
@@ -29,10 +61,31 @@ CSV_FIELD_ALIASES = {
     "postCode": ["postcode", "postCode", "post_code", "post code", "zip", "zip_code"],
     "price": ["price", "unit_price", "unitPrice", "unitprice", "unit price", "amount"],
 }
+SKU_ALLOWED = frozenset(string.ascii_letters + string.digits + "-_./")
+_SKU_DELETE_ALLOWED = str.maketrans("", "", "".join(sorted(SKU_ALLOWED)))
+SKU_PATTERN = r"[A-Za-z0-9._/\-]{1,64}"
+_SKU_FULLMATCH = re.compile(SKU_PATTERN).fullmatch
+_PRICE_STRIP = str.maketrans("", "", "$€£AUDaud, ")
+ARROW_MIN_BYTES = 1 << 20
+ARROW_BLOCK_SIZE = 16 << 20
+MANY_MAX_WORKERS = 8
+VALIDATE_CHUNK_ROWS = 50000
+NDJSON_BATCH_LINES = 65536
+EXPORT_BUFFER_SIZE = 1 << 20
+EXPORT_GZIP_LEVEL = 1
+EXPORT_QUEUE_SIZE = 8
+EXPORT_FADVISE_MIN_BYTES = 64 << 20
+EXPORT_FIELDS = ["postCode", "sku", "price"]
+EXPORT_CHUNK_ROWS = 10000
+URING_QUEUE_DEPTH = 64
+URING_MAX_BYTES = 1 << 20
+ARROW_SKU_RE = f"^{SKU_PATTERN}$"
+ARROW_POSTCODE_RE = r"^[0-9]{4}$"
+ARROW_PRICE_RE = r"^([0-9]+\.?[0-9]{0,2}|\.[0-9]{1,2})$"
 def _ensure_app_dir(): os.makedirs(APP_DIR, exist_ok=True)
 def load_settings() -> dict:
     _ensure_app_dir()
-    if not os.path.exists(CONFIG_PATH): return json.loads(json.dumps(DEFAULT_SETTINGS))
+    if not os.path.exists(CONFIG_PATH): return deepcopy(DEFAULT_SETTINGS)
     try:
         with open(CONFIG_PATH, "r", encoding="utf-8") as f: data = json.load(f)
         def deep_merge(d, default):
@@ -40,16 +93,22 @@ def load_settings() -> dict:
                 if k not in d: d[k] = v
                 elif isinstance(v, dict) and isinstance(d[k], dict): deep_merge(d[k], v)
             return d
-        return deep_merge(data, json.loads(json.dumps(DEFAULT_SETTINGS)))
+        return deep_merge(data, deepcopy(DEFAULT_SETTINGS))
     except Exception:
-        return json.loads(json.dumps(DEFAULT_SETTINGS))
+        return deepcopy(DEFAULT_SETTINGS)
 def save_settings(cfg: dict) -> None:
     _ensure_app_dir()
     with open(CONFIG_PATH, "w", encoding="utf-8") as f: json.dump(cfg, f, indent=2)
 def normalize_str(v: Any) -> str:
     if v is None: return ""
     if isinstance(v, (int, float)): return str(v).strip()
+    if isinstance(v, Decimal): return str(float(v))
     return str(v).strip().strip('"').strip()
+def _loads(data: str) -> Any:
+    if orjson is not None:
+        try: return orjson.loads(data)
+        except orjson.JSONDecodeError: pass
+    return json.loads(data)
 def _lower_keys(d: Mapping[str, Any]) -> dict[str, Any]: return {(k or "").strip().lower(): v for k, v in d.items()}
 def field_from_row(row: Mapping[str, Any], key: str) -> Any:
     for alias in CSV_FIELD_ALIASES.get(key, []):
@@ -57,103 +116,203 @@ def field_from_row(row: Mapping[str, Any], key: str) -> Any:
         if a in row: return row.get(a)
     return None
 def is_valid_sku(s: str) -> tuple[bool, str]:
-    s = normalize_str(s)
     if not s: return False, "sku empty"
-    for ch in s:
-        if not (ch.isalnum() or ch in "-_./"): return False, "sku has invalid characters"
+    if _SKU_FULLMATCH(s): return True, ""
+    rest = s.translate(_SKU_DELETE_ALLOWED)
+    if rest and not rest.isalnum(): return False, "sku has invalid characters"
     if len(s) > 64: return False, "sku too long"
     return True, ""
 def is_valid_postcode(pc: str) -> tuple[bool, str]:
-    pc = normalize_str(pc)
     if not pc: return False, "postCode empty"
     if not pc.isdigit() or len(pc) != 4: return False, "postCode must be 4 digits"
     return True, ""
-def normalize_price(p: str) -> tuple[bool, float, str]:
-    s = normalize_str(p)
-    if s == "": return False, 0.0, "price empty"
-    clean = s.replace(",", "")
-    for sym in "$€£AUDaud ": clean = clean.replace(sym, "")
-    try: val = float(clean)
+def normalize_price(s: str) -> tuple[bool, float, str]:
+    if not s: return False, 0.0, "price empty"
+    try: val = float(s.translate(_PRICE_STRIP))
     except Exception: return False, 0.0, "price not a number"
     if val < 0: return False, 0.0, "price negative"
     if math.isinf(val) or math.isnan(val): return False, 0.0, "price not finite"
     return True, round(val, 2), ""
-def build_doc(raw_sku: str, raw_pc: str, price_val: float) -> dict[str, Any]:
-    return {"sku": normalize_str(raw_sku), "postCode": normalize_str(raw_pc), "price": float(price_val)}
-def _validate_from_reader(reader: csv.DictReader) -> tuple[list[dict], list[dict], list[str]]:
-    valid_docs, errors, warnings, seen_ids = [], [], [], set()
-    raw_fieldnames = reader.fieldnames or []
-    fieldnames_lc = [(h or "").strip().lower() for h in raw_fieldnames]
-    if not fieldnames_lc:
-        errors.append({"row": 1, "context": "header", "error": "Missing header row"})
-        return valid_docs, errors, warnings
-    missing_min = []
-    for key in ["sku", "postCode", "price"]:
-        if not any(alias.lower() in fieldnames_lc for alias in CSV_FIELD_ALIASES[key]): missing_min.append(key)
-    if missing_min:
-        errors.append({"row": 1, "context": "header", "error": f"Missing required columns: {', '.join(missing_min)}"})
-        return valid_docs, errors, warnings
-    for idx, row in enumerate(reader, start=2):
-        row = _lower_keys(row)
-        raw_sku = normalize_str(field_from_row(row, "sku"))
-        raw_pc = normalize_str(field_from_row(row, "postCode"))
-        raw_price = normalize_str(field_from_row(row, "price"))
-        if not raw_sku and not raw_pc and not raw_price: continue
+def new_docs() -> dict[str, Any]:
+    return {"sku": [], "postCode": [], "price": array("d")}
+def build_doc(docs: dict[str, Any], raw_sku: str, raw_pc: str, price_val: float) -> None:
+    docs["sku"].append(raw_sku); docs["postCode"].append(raw_pc); docs["price"].append(price_val)
+def _resolve_field_indices(fieldnames_lc: list[str]) -> dict[str, Optional[int]]:
+    last = {h: i for i, h in enumerate(fieldnames_lc)}
+    return {key: next((last[a.lower()] for a in aliases if a.lower() in last), None) for key, aliases in CSV_FIELD_ALIASES.items()}
+def _row_errors(raw_sku: str, raw_pc: str, raw_price: str) -> tuple[list[str], float]:
+    """Error messages for one row of already-normalized fields; validators only run on non-empty values."""
+    errs, norm_price = [], 0.0
+    if not raw_sku: errs.append("sku missing")
+    if not raw_pc: errs.append("postCode missing")
+    if not raw_price: errs.append("price missing")
+    if raw_sku:
         ok_sku, sku_err = is_valid_sku(raw_sku)
+        if not ok_sku: errs.append(sku_err)
+    if raw_pc:
         ok_pc, pc_err = is_valid_postcode(raw_pc)
+        if not ok_pc: errs.append(pc_err)
+    if raw_price:
         ok_price, norm_price, price_err = normalize_price(raw_price)
-        errs = []
-        if not raw_sku: errs.append("sku missing")
-        if not raw_pc: errs.append("postCode missing")
-        if not raw_price: errs.append("price missing")
-        if raw_sku and not ok_sku: errs.append(sku_err)
-        if raw_pc and not ok_pc: errs.append(pc_err)
-        if raw_price and not ok_price: errs.append(price_err)
+        if not ok_price: errs.append(price_err)
+    return errs, norm_price
+def _iter_rows(rows, sku_idx: int, pc_idx: int, price_idx: int):
+    width, idx = max(sku_idx, pc_idx, price_idx) + 1, 1
+    for row in rows:
+        if not row: continue
+        idx += 1
+        if len(row) < width: row = row + [""] * (width - len(row))
+        yield idx, row[sku_idx], row[pc_idx], row[price_idx]
+def _validate_chunk(rows: list[tuple[int, str, str, str]]) -> tuple[list[tuple[int, str, str, float]], list[dict]]:
+    valid, errors = [], []
+    for idx, raw_sku, raw_pc, raw_price in rows:
+        if fast_validate_row is not None:
+            val = fast_validate_row(raw_sku, raw_pc, raw_price)
+            if val >= 0:
+                valid.append((idx, raw_sku, raw_pc, round(val, 2))); continue
+        raw_sku, raw_pc, raw_price = normalize_str(raw_sku), normalize_str(raw_pc), normalize_str(raw_price)
+        if not raw_sku and not raw_pc and not raw_price: continue
+        if len(raw_pc) == 4 and raw_pc.isdigit() and _SKU_FULLMATCH(raw_sku):
+            ok_price, norm_price, _ = normalize_price(raw_price)
+            if ok_price:
+                valid.append((idx, raw_sku, raw_pc, norm_price)); continue
+        errs, norm_price = _row_errors(raw_sku, raw_pc, raw_price)
         if errs:
             errors.append({"row": idx, "context": f"sku={raw_sku}, postCode={raw_pc}", "error": "; ".join(errs)})
             continue
-        doc_id = f"{raw_sku}|{raw_pc}"
+        valid.append((idx, raw_sku, raw_pc, norm_price))
+    return valid, errors
+def _merge_chunk(chunk_valid: list[tuple[int, str, str, float]], chunk_errors: list[dict], valid_docs: dict, errors: list[dict], seen_ids: set) -> None:
+    dups, seen_add = [], seen_ids.add
+    sku_append, pc_append, price_append = valid_docs["sku"].append, valid_docs["postCode"].append, valid_docs["price"].append
+    for idx, raw_sku, raw_pc, norm_price in chunk_valid:
+        doc_id = (raw_sku, raw_pc)
         if doc_id in seen_ids:
-            errors.append({"row": idx, "context": f"sku={raw_sku}, postCode={raw_pc}", "error": "Duplicate id within file"})
+            dups.append({"row": idx, "context": f"sku={raw_sku}, postCode={raw_pc}", "error": "Duplicate id within file"})
             continue
-        seen_ids.add(doc_id)
-        valid_docs.append(build_doc(raw_sku, raw_pc, norm_price))
+        seen_add(doc_id); sku_append(raw_sku); pc_append(raw_pc); price_append(norm_price)
+    errors.extend(heapq.merge(chunk_errors, dups, key=itemgetter("row")) if dups else chunk_errors)
+def _validate_from_reader(reader) -> tuple[dict, list[dict], list[str]]:
+    valid_docs, errors, warnings, seen_ids = new_docs(), [], [], set()
+    raw_fieldnames = next(reader, [])
+    fieldnames_lc = [(h or "").strip().lower() for h in raw_fieldnames]
+    if not fieldnames_lc:
+        errors.append({"row": 1, "context": "header", "error": "Missing header row"})
+        return valid_docs, errors, warnings
+    idxs = _resolve_field_indices(fieldnames_lc)
+    missing_min = [key for key, i in idxs.items() if i is None]
+    if missing_min:
+        errors.append({"row": 1, "context": "header", "error": f"Missing required columns: {', '.join(missing_min)}"})
+        return valid_docs, errors, warnings
+    rows = _iter_rows(reader, idxs["sku"], idxs["postCode"], idxs["price"])
+    for chunk in iter(lambda: list(islice(rows, VALIDATE_CHUNK_ROWS)), []): _merge_chunk(*_validate_chunk(chunk), valid_docs, errors, seen_ids)
     return valid_docs, errors, warnings
-def validate_csv(file_path: str) -> tuple[list[dict], list[dict], list[str]]:
+def _validate_from_arrow(file_path: str) -> Optional[tuple[dict, list[dict], list[str]]]:
+    """Columnar fast path for large CSVs; returns None when the Python reader should handle the file."""
+    with open(file_path, newline="", encoding="utf-8-sig") as f: header = next(csv.reader(f), [])
+    idxs = _resolve_field_indices([(h or "").strip().lower() for h in header])
+    if not header or None in idxs.values(): return None
+    names = [f"c{i}" for i in range(len(header))]
+    cols = [names[idxs[k]] for k in ("sku", "postCode", "price")]
     try:
-        with open(file_path, newline="", encoding="utf-8-sig") as f:
-            reader = csv.DictReader(f)
-            return _validate_from_reader(reader)
+        tbl = pa_csv.read_csv(file_path,
+            read_options=pa_csv.ReadOptions(column_names=names, skip_rows=1, block_size=ARROW_BLOCK_SIZE),
+            parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa_csv.ConvertOptions(column_types={n: pa.string() for n in names}, include_columns=list(dict.fromkeys(cols))))
+    except (pa.ArrowInvalid, UnicodeDecodeError): return None
+    sku, pcode, price = (tbl.column(c) for c in cols)
+    # At most two decimals, so the cast value already equals round(val, 2); anything else takes the Python rules below.
+    clean = pa_compute.and_(pa_compute.and_(pa_compute.match_substring_regex(sku, ARROW_SKU_RE), pa_compute.match_substring_regex(pcode, ARROW_POSTCODE_RE)), pa_compute.match_substring_regex(price, ARROW_PRICE_RE))
+    price_val = pa_compute.if_else(clean, price, "0").cast(pa.float64())
+    # Overflowing digit strings cast to inf; send them to _row_errors like every other path does.
+    clean = pa_compute.and_(clean, pa_compute.is_finite(price_val))
+    row_no = pa.array(range(2, tbl.num_rows + 2), pa.int64())
+    errors, warnings, slow = [], [], ([], [], [], array("d"))
+    dirty = pa_compute.invert(clean)
+    for idx, s, p, raw_price in zip(*(pa_compute.filter(c, dirty).to_pylist() for c in (row_no, sku, pcode, price))):
+        s, p, raw_price = normalize_str(s), normalize_str(p), normalize_str(raw_price)
+        if not s and not p and not raw_price: continue
+        errs, norm_price = _row_errors(s, p, raw_price)
+        if errs:
+            errors.append({"row": idx, "context": f"sku={s}, postCode={p}", "error": "; ".join(errs)})
+            continue
+        for col, v in zip(slow, (idx, s, p, norm_price)): col.append(v)
+    fields = ["row", "sku", "postCode", "price"]
+    valid = pa.table([pa_compute.filter(c, clean) for c in (row_no, sku, pcode, price_val)], names=fields)
+    del tbl, sku, pcode, price, price_val, row_no, clean, dirty
+    if slow[0]:
+        slow_tbl = pa.table([pa.array(slow[0], pa.int64()), pa.array(slow[1], pa.string()), pa.array(slow[2], pa.string()), pa.array(slow[3], pa.float64())], names=fields)
+        valid = pa.concat_tables([valid, slow_tbl]).sort_by("row")
+    # The first row of each (sku, postCode) wins; later ones are reported as duplicates.
+    first = pa_compute.is_in(valid["row"], value_set=valid.group_by(["sku", "postCode"]).aggregate([("row", "min")])["row_min"])
+    dups = valid.filter(pa_compute.invert(first))
+    dup_errors = [{"row": r, "context": f"sku={s}, postCode={p}", "error": "Duplicate id within file"} for r, s, p in zip(*(dups[c].to_pylist() for c in ("row", "sku", "postCode")))]
+    valid = valid.filter(first)
+    del first, dups
+    # Hand the intermediate buffers back before the Python lists are built, so the two peaks don't stack.
+    pa.default_memory_pool().release_unused()
+    valid_docs = {"sku": valid["sku"].to_pylist(), "postCode": valid["postCode"].to_pylist(), "price": array("d")}
+    if valid.num_rows:
+        prices = valid["price"].combine_chunks()
+        valid_docs["price"].frombytes(memoryview(prices.buffers()[1])[prices.offset * 8:(prices.offset + len(prices)) * 8])
+    return valid_docs, list(heapq.merge(errors, dup_errors, key=itemgetter("row"))), warnings
+class _MmapReader(io.RawIOBase):
+    """Raw source copying straight out of a read-only mmap, so the text layer streams the file instead of decoding it whole."""
+    def __init__(self, mm: mmap.mmap):
+        self._mm, self._view, self._pos = mm, memoryview(mm), 0
+    def readable(self) -> bool: return True
+    def readinto(self, b) -> int:
+        n = min(len(b), len(self._view) - self._pos)
+        b[:n] = self._view[self._pos:self._pos + n]; self._pos += n
+        return n
+    def close(self) -> None:
+        if not self.closed: self._view.release(); self._mm.close()
+        super().close()
+def _open_text(file_path: str):
+    with open(file_path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0: return io.StringIO("")
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return io.TextIOWrapper(io.BufferedReader(_MmapReader(mm)), encoding="utf-8-sig", newline="")
+def validate_csv(file_path: str) -> tuple[dict, list[dict], list[str]]:
+    try:
+        if pa is not None and os.path.getsize(file_path) >= ARROW_MIN_BYTES:
+            result = _validate_from_arrow(file_path)
+            if result is not None: return result
+        with _open_text(file_path) as f: return _validate_from_reader(csv.reader(f))
     except Exception as e:
-        return [], [{"row": 0, "context": "file", "error": f"Read error: {e}"}], []
-def validate_json(file_path: str) -> tuple[list[dict], list[dict], list[str]]:
-    valid_docs, errors, warnings, seen_ids = [], [], [], set()
+        return new_docs(), [{"row": 0, "context": "file", "error": f"Read error: {e}"}], []
+def validate_json(file_path: str) -> tuple[dict, list[dict], list[str]]:
+    valid_docs, errors, warnings, seen_ids = new_docs(), [], [], set()
     def validate_obj(obj: dict, idx_for_report: int) -> None:
         obj_lc = _lower_keys(obj)
         raw_sku = normalize_str(field_from_row(obj_lc, "sku"))
         raw_pc = normalize_str(field_from_row(obj_lc, "postCode"))
         raw_price = normalize_str(field_from_row(obj_lc, "price"))
-        ok_sku, sku_err = is_valid_sku(raw_sku)
-        ok_pc, pc_err = is_valid_postcode(raw_pc)
-        ok_price, norm_price, price_err = normalize_price(raw_price)
-        errs = []
-        if not raw_sku: errs.append("sku missing")
-        if not raw_pc: errs.append("postCode missing")
-        if raw_price == "": errs.append("price missing")
-        if raw_sku and not ok_sku: errs.append(sku_err)
-        if raw_pc and not ok_pc: errs.append(pc_err)
-        if raw_price != "" and not ok_price: errs.append(price_err)
+        errs, norm_price = _row_errors(raw_sku, raw_pc, raw_price)
         if errs:
             errors.append({"row": idx_for_report, "context": f"sku={raw_sku}, postCode={raw_pc}", "error": "; ".join(errs)})
             return
-        doc_id = f"{raw_sku}|{raw_pc}"
+        doc_id = (raw_sku, raw_pc)
         if doc_id in seen_ids:
             errors.append({"row": idx_for_report, "context": f"sku={raw_sku}, postCode={raw_pc}", "error": "Duplicate id within file"})
             return
         seen_ids.add(doc_id)
-        valid_docs.append(build_doc(raw_sku, raw_pc, norm_price))
+        build_doc(valid_docs, raw_sku, raw_pc, norm_price)
     try:
-        with open(file_path, encoding="utf-8") as f: data = json.load(f)
+        with open(file_path, "rb") as f:
+            if ijson is not None and f.read(1024).lstrip().startswith(b"["):
+                f.seek(0)
+                try:
+                    for i, obj in enumerate(ijson.items(f, "item"), start=1):
+                        if not isinstance(obj, dict):
+                            errors.append({"row": i, "context": "", "error": "Each item must be a JSON object"})
+                            continue
+                        validate_obj(obj, i)
+                    return valid_docs, errors, warnings
+                except (ijson.JSONError, ValueError):
+                    for col in valid_docs.values(): del col[:]
+                    errors.clear(); seen_ids.clear()
+        with open(file_path, encoding="utf-8") as f: data = _loads(f.read())
         if isinstance(data, list):
             for i, obj in enumerate(data, start=1):
                 if not isinstance(obj, dict):
@@ -166,26 +325,213 @@ def validate_json(file_path: str) -> tuple[list[dict], list[dict], list[str]]:
     except json.JSONDecodeError:
         warnings.append("JSON is not an array; attempting NDJSON (one JSON object per line).")
     try:
-        with open(file_path, encoding="utf-8") as f:
-            for i, line in enumerate(f, start=1):
-                line = line.strip()
-                if not line: continue
-                try:
-                    obj = json.loads(line)
-                    if not isinstance(obj, dict):
-                        errors.append({"row": i, "context": "", "error": "Line is not a JSON object"})
+        with open(file_path, encoding="utf-8") as f: lines = list(map(str.strip, f.read().split("\n")))
+        line_nums = [i for i, line in enumerate(lines, start=1) if line]
+        fast_loads = orjson.loads if orjson is not None else json.loads
+        for start in range(0, len(line_nums), NDJSON_BATCH_LINES):
+            batch = line_nums[start:start + NDJSON_BATCH_LINES]
+            try: objs = list(map(fast_loads, [lines[i - 1] for i in batch]))
+            except ValueError: objs = None
+            for n, i in enumerate(batch):
+                if objs is None:
+                    try: obj = _loads(lines[i - 1])
+                    except json.JSONDecodeError as e:
+                        errors.append({"row": i, "context": "", "error": f"Invalid JSON: {e}"})
                         continue
-                    validate_obj(obj, i)
-                except json.JSONDecodeError as e:
-                    errors.append({"row": i, "context": "", "error": f"Invalid JSON: {e}"})
+                else: obj = objs[n]
+                if not isinstance(obj, dict):
+                    errors.append({"row": i, "context": "", "error": "Line is not a JSON object"})
+                    continue
+                validate_obj(obj, i)
     except Exception as e:
         errors.append({"row": 0, "context": "", "error": f"Error reading file line-by-line: {e}"})
     return valid_docs, errors, warnings
-def validate_pasted_csv_text(text: str) -> tuple[list[dict], list[dict], list[str]]:
+def validate_pasted_csv_text(text: str) -> tuple[dict, list[dict], list[str]]:
     lines = [ln for ln in text.splitlines() if ln.strip() != ""]
-    if not lines: return [], [{"row": 1, "context": "header", "error": "No content"}], []
-    reader = csv.DictReader(lines)
+    if not lines: return new_docs(), [{"row": 1, "context": "header", "error": "No content"}], []
+    reader = csv.reader(lines)
     return _validate_from_reader(reader)
+def validate_file(file_path: str) -> tuple[dict, list[dict], list[str]]:
+    ext = os.path.splitext(file_path)[1].lower()
+    if ext == ".csv": return validate_csv(file_path)
+    if ext == ".json": return validate_json(file_path)
+    return new_docs(), [{"row": 0, "context": "file", "error": f"Unsupported file type: {ext or file_path}"}], []
+def _validate_csv_bytes(data: bytes) -> tuple[dict, list[dict], list[str]]:
+    try: return _validate_from_reader(csv.reader(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")))
+    except Exception as e: return new_docs(), [{"row": 0, "context": "file", "error": f"Read error: {e}"}], []
+def _read_many_uring(paths: list[str]):
+    """Read whole files through one io_uring, keeping up to URING_QUEUE_DEPTH reads in flight.
+
+    Yields (index, bytes | OSError) as each read completes, so callers can validate and drop a buffer before the rest land."""
+    ring, cqe = liburing.Ring(), liburing.Cqe()
+    liburing.io_uring_queue_init(URING_QUEUE_DEPTH, ring)
+    try:
+        for start in range(0, len(paths), URING_QUEUE_DEPTH):
+            fds, bufs = {}, {}
+            try:
+                for i in range(start, min(start + URING_QUEUE_DEPTH, len(paths))):
+                    try: fds[i] = os.open(paths[i], os.O_RDONLY)
+                    except OSError as e: yield i, e; continue
+                    bufs[i] = bytearray(os.fstat(fds[i]).st_size)
+                    sqe = liburing.io_uring_get_sqe(ring)
+                    liburing.io_uring_prep_read(sqe, fds[i], bufs[i], 0); liburing.io_uring_sqe_set_data64(sqe, i)
+                liburing.io_uring_submit(ring)
+                for _ in range(len(fds)):
+                    liburing.trap_error(liburing.io_uring_wait_cqe(ring, cqe))
+                    entry = cqe[0]; i, res = liburing.io_uring_cqe_get_data64(entry), entry.res
+                    liburing.io_uring_cqe_seen(ring, entry)
+                    if res < 0: yield i, OSError(-res, os.strerror(-res), paths[i]); continue
+                    buf = bufs.pop(i)
+                    while res < len(buf):
+                        chunk = os.pread(fds[i], len(buf) - res, res)
+                        if not chunk: del buf[res:]; break
+                        buf[res:res + len(chunk)] = chunk; res += len(chunk)
+                    yield i, bytes(buf)
+            finally:
+                for fd in fds.values(): os.close(fd)
+    finally:
+        liburing.io_uring_queue_exit(ring)
+def validate_many(paths: list[str]) -> list[tuple[dict, list[dict], list[str]]]:
+    """Validate several files at once; small CSVs are read together via io_uring on Linux, the rest on a thread pool."""
+    if not paths: return []
+    results: list = [None] * len(paths)
+    if liburing is not None and platform.system() == "Linux":
+        # Larger files stream through validate_file's mmap/Arrow paths instead of being read whole.
+        batch = [i for i, p in enumerate(paths) if p.lower().endswith(".csv") and os.path.isfile(p) and os.path.getsize(p) < URING_MAX_BYTES]
+        try:
+            for j, data in _read_many_uring([paths[i] for i in batch]):
+                results[batch[j]] = _validate_csv_bytes(data) if isinstance(data, bytes) else (new_docs(), [{"row": 0, "context": "file", "error": f"Read error: {data}"}], [])
+        except (OSError, RuntimeError): pass
+    rest = [i for i, r in enumerate(results) if r is None]
+    if rest:
+        with ThreadPoolExecutor(max_workers=min(MANY_MAX_WORKERS, len(rest))) as ex:
+            for i, r in zip(rest, ex.map(validate_file, [paths[i] for i in rest])): results[i] = r
+    return results
+def doc_rows(docs: dict[str, Any]) -> list[dict]:
+    return [{"postCode": pc, "sku": sku, "price": price} for pc, sku, price in zip(docs["postCode"], docs["sku"], docs["price"])]
+def take_docs(docs: dict[str, Any], idx: list[int]) -> dict[str, list]:
+    return {k: [col[i] for i in idx] for k, col in docs.items()}
+def price_stats(prices: array) -> tuple[Optional[float], Optional[float], Optional[float]]:
+    if not prices: return None, None, None
+    if np is not None:
+        arr = np.frombuffer(prices, dtype=np.float64)
+        return float(arr.min()), float(arr.max()), round(float(arr.mean()), 6)
+    return min(prices), max(prices), round(math.fsum(prices) / len(prices), 6)
+class _MmapWriter(io.RawIOBase):
+    """Raw sink copying writes into a memory-mapped file; grows by doubling and trims to the bytes written on close."""
+    def __init__(self, path: str, size_hint: int):
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+        self._size, self._pos = max(size_hint, mmap.PAGESIZE), 0
+        os.ftruncate(self._fd, self._size); self._mm = mmap.mmap(self._fd, self._size)
+    def writable(self) -> bool: return True
+    def write(self, b) -> int:
+        n = memoryview(b).nbytes; end = self._pos + n
+        if end > self._size:
+            self._mm.close(); self._size = max(end, self._size * 2)
+            os.ftruncate(self._fd, self._size); self._mm = mmap.mmap(self._fd, self._size)
+        self._mm[self._pos:end] = b; self._pos = end
+        return n
+    def close(self) -> None:
+        if not self.closed:
+            try: self._mm.close(); os.ftruncate(self._fd, self._pos)
+            finally: os.close(self._fd)
+        super().close()
+def _open_export(path: str, compress: bool = False, mmap_hint: int = 0):
+    if compress: return io.BufferedWriter(gzip.open(path, 'wb', compresslevel=EXPORT_GZIP_LEVEL), EXPORT_BUFFER_SIZE)
+    if mmap_hint: return io.BufferedWriter(_MmapWriter(path, mmap_hint), EXPORT_BUFFER_SIZE)
+    return open(path, 'wb', buffering=EXPORT_BUFFER_SIZE)
+def _json_dumper(indent: bool):
+    """Return a function dumping a list of row dicts to JSON bytes in the configured style."""
+    if orjson is not None:
+        option = orjson.OPT_INDENT_2 if indent else 0
+        return lambda rows: orjson.dumps(rows, option=option)
+    # Compact output (indent=None) lets json use its C encoder.
+    enc = json.JSONEncoder(indent=2 if indent else None, separators=None if indent else (",", ":"), ensure_ascii=False, check_circular=False)
+    return lambda rows: enc.encode(rows).encode("utf-8")
+_CSV_EMITTERS: dict[tuple[str, ...], Any] = {}
+def _csv_emitter(fields: tuple[str, ...]):
+    """Compile, once per schema, a function rendering column slices as CSV lines with one f-string per row (no quoting)."""
+    emit = _CSV_EMITTERS.get(fields)
+    if emit is None:
+        names = ", ".join(f"c{i}" for i in range(len(fields)))
+        line = ",".join(f"{{c{i}}}" for i in range(len(fields)))
+        ns: dict[str, Any] = {}
+        exec(f'def _emit(cols):\n    return "".join([f"{line}\\r\\n" for {names}, in zip(*cols)])', ns)
+        emit = _CSV_EMITTERS[fields] = ns["_emit"]
+    return emit
+def _csv_lines(docs: dict[str, Any]) -> bytes:
+    # No quoting needed: validated postcodes pass isdigit() and SKUs are only isalnum() characters (not just ASCII)
+    # plus "-_./", so neither can hold a comma, quote, CR or LF; prices are floats.
+    cols = ([pc.lstrip("0") for pc in docs["postCode"]], docs["sku"], docs["price"])
+    return _csv_emitter(tuple(EXPORT_FIELDS))(cols).encode("utf-8")
+class _BackgroundWriter:
+    """Single daemon thread draining a bounded queue of serialized files, so disk I/O overlaps with serializing the next batch."""
+    def __init__(self, use_mmap: bool = False):
+        self.use_mmap, self._error = use_mmap, None
+        self._queue: queue.Queue = queue.Queue(maxsize=EXPORT_QUEUE_SIZE)
+        self._thread = threading.Thread(target=self._run, name="export-writer", daemon=True); self._thread.start()
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None: return
+            path, chunks, compress = item
+            if self._error is not None: continue
+            size = sum(map(len, chunks))
+            advise = hasattr(os, "posix_fadvise") and not self.use_mmap and size >= EXPORT_FADVISE_MIN_BYTES
+            try:
+                with _open_export(path, compress=compress, mmap_hint=size if self.use_mmap else 0) as f:
+                    if advise: os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                    try: f.writelines(chunks)
+                    finally:
+                        # Exported files are not read back: start writeback now and let the kernel drop the pages.
+                        if advise: f.flush(); os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            except Exception as e: self._error = e
+    def write(self, path: str, chunks: list[bytes], compress: bool = False) -> None: self._queue.put((path, chunks, compress))
+    def close(self) -> None:
+        """Wait for every queued file to hit disk; re-raises the first write error."""
+        self._queue.put(None); self._thread.join()
+        if self._error is not None: raise self._error
+def _write_group(sink: _BackgroundWriter, csv_path: Optional[str], json_path: Optional[str], docs: dict[str, Any], compress: bool, indent: bool = False) -> None:
+    """Serialize one batch's CSV and JSON in a single pass over EXPORT_CHUNK_ROWS column slices and queue both files."""
+    total, dumps = len(docs["sku"]), _json_dumper(indent)
+    # Each JSON slice is dumped as its own array; dropping its brackets and re-joining gives the same bytes as one dump.
+    head, sep, tail = (b"[\n", b",\n", b"\n]") if indent else (b"[", b",", b"]")
+    csv_out, json_out = [(",".join(EXPORT_FIELDS) + "\r\n").encode("utf-8")], [head if total else b"[]"]
+    for start in range(0, total, EXPORT_CHUNK_ROWS):
+        part = {k: col[start:start + EXPORT_CHUNK_ROWS] for k, col in docs.items()}
+        if csv_path: csv_out.append(_csv_lines(part))
+        if json_path:
+            if start: json_out.append(sep)
+            json_out.append(memoryview(dumps(doc_rows(part)))[len(head):-len(tail)])
+    if total: json_out.append(tail)
+    if csv_path: sink.write(csv_path, csv_out)
+    if json_path: sink.write(json_path, json_out, compress)
+_PATTERN_FMT = string.Formatter()
+_FIELD_ROOT = re.compile(r"[^.[]*")
+def _path_template(pattern: str, folder: str, base: str, ts: str) -> tuple[str, frozenset[str]]:
+    """Pre-bind the per-export fields ({base}, {ts}) and the folder prefix so each file only formats batch/group/ext.
+
+    Also returns the names of the fields left for _render_path, taken from the parsed pattern rather than the escaped text."""
+    bound, left, out = {"base": base, "ts": ts}, set(), [(folder.rstrip(os.sep) + os.sep).replace("{", "{{").replace("}", "}}") if folder else ""]
+    for literal, field, spec, conv in _PATTERN_FMT.parse(pattern):
+        out.append(literal.replace("{", "{{").replace("}", "}}"))
+        if field is None: continue
+        root = _FIELD_ROOT.match(field).group()
+        if root in bound:
+            value = _PATTERN_FMT.convert_field(_PATTERN_FMT.get_field(field, (), bound)[0], conv)
+            out.append(_PATTERN_FMT.format_field(value, spec).replace("{", "{{").replace("}", "}}"))
+        else: left.add(root); out.append("{" + field + (f"!{conv}" if conv else "") + (f":{spec}" if spec else "") + "}")
+    return "".join(out), frozenset(left)
+def _render_path(template: str, batch: str, group: str, ext: str, part: str = "") -> str:
+    return template.format(batch=batch, group=group or "all", ext=ext.lstrip("."), part=part)
+class _SanitizeTable(dict):
+    """str.translate table sending anything but alphanumerics and "-_." to "_"; filled lazily per code point."""
+    def __missing__(self, cp: int) -> int:
+        ch = chr(cp)
+        self[cp] = out = cp if ch.isalnum() or ch in "-_." else ord("_")
+        return out
+_SANITIZE_TABLE = _SanitizeTable()
+def _sanitize_group(s: str) -> str: return s.translate(_SANITIZE_TABLE)[:80] or "UNK"
 class App:
     def __init__(self, root: tk.Tk):
         self.root = root
@@ -196,7 +542,7 @@ class App:
         self.settings = load_settings()
         self.file_path: Optional[str] = None
         self.headers: list[str] = []
-        self.last_valid_docs: list[dict] = []
+        self.last_valid_docs: dict[str, Any] = new_docs()
         self.last_errors: list[dict] = []
         self.last_warnings: list[str] = []
         self.cached_stats: dict[str, Any] = {}
@@ -205,11 +551,14 @@ class App:
         self.filename_pattern_var = tk.StringVar(value=self.settings["export"]["filename_pattern"])
         self.export_csv_var = tk.BooleanVar(value=self.settings["export"]["formats"]["csv"])
         self.export_json_var = tk.BooleanVar(value=self.settings["export"]["formats"]["json"])
+        self.compress_var = tk.BooleanVar(value=self.settings["export"]["compress"])
+        self.json_indent_var = tk.BooleanVar(value=self.settings["export"]["json_indent"])
+        self.mmap_var = tk.BooleanVar(value=self.settings["export"]["mmap"])
         self.enable_batch_var = tk.BooleanVar(value=self.settings["batch"]["enabled"])
         self.batch_mode_var = tk.StringVar(value=self.settings["batch"]["mode"])
         self.rows_per_file_var = tk.IntVar(value=self.settings["batch"]["rows_per_file"])
         self.group_column_var = tk.StringVar(value=self.settings["batch"]["group_column"])
-        self._ensure_export_dir()
+        self._normalize_export_dir()
         self._build_ui()
     def _build_ui(self) -> None:
         self.root.columnconfigure(0, weight=1); self.root.rowconfigure(0, weight=1)
@@ -273,6 +622,9 @@ class App:
         fm.columnconfigure(0, weight=1)
         ttk.Checkbutton(fm, text="CSV", variable=self.export_csv_var).grid(row=0, column=0, sticky="w")
         ttk.Checkbutton(fm, text="JSON", variable=self.export_json_var).grid(row=1, column=0, sticky="w")
+        ttk.Checkbutton(fm, text="Gzip JSON (.json.gz)", variable=self.compress_var).grid(row=2, column=0, sticky="w")
+        ttk.Checkbutton(fm, text="Memory-map output files", variable=self.mmap_var).grid(row=3, column=0, sticky="w")
+        ttk.Checkbutton(fm, text="Indent JSON (larger, slower)", variable=self.json_indent_var).grid(row=4, column=0, sticky="w")
         out = ttk.LabelFrame(scroll, text="Output Settings", padding=6)
         out.grid(row=2, column=0, sticky="ew", pady=(0, 8))
         for c in range(4): out.columnconfigure(c, weight=1 if c == 1 else 0)
@@ -283,7 +635,7 @@ class App:
         ttk.Label(out, text="Filename Pattern:").grid(row=1, column=0, sticky="w")
         self.pattern_entry = ttk.Entry(out, textvariable=self.filename_pattern_var)
         self.pattern_entry.grid(row=1, column=1, columnspan=2, sticky="ew")
-        ttk.Label(out, text="Tokens: {base}{batch}{group}{ts}{ext}").grid(row=2, column=1, sticky="w")
+        ttk.Label(out, text="Tokens: {base}{batch}{group}{part}{ts}{ext}").grid(row=2, column=1, sticky="w")
         ttk.Checkbutton(out, text="Open folder after export", variable=self.open_folder_after_var).grid(row=3, column=1, sticky="w")
         lf = ttk.LabelFrame(scroll, text="Batch Export", padding=6)
         lf.grid(row=3, column=0, sticky="ew", pady=(0, 8))
@@ -306,17 +658,16 @@ class App:
         act.grid(row=7, column=0, sticky="w", pady=(12, 0))
         ttk.Button(act, text="Save Settings", command=self._save_all_settings, bootstyle=SUCCESS).pack(side="left", padx=(0, 8))
         ttk.Button(act, text="Open Config Folder", command=self._open_config_folder, bootstyle=PRIMARY).pack(side="left")
-    def _ensure_export_dir(self) -> None:
-        folder = self.output_folder_var.get().strip() or os.path.abspath("export")
-        self.output_folder_var.set(folder)
-        os.makedirs(folder, exist_ok=True)
+    def _normalize_export_dir(self) -> None:
+        """Fill in the default folder; it is created once per export run, not on startup or save."""
+        self.output_folder_var.set(self.output_folder_var.get().strip() or os.path.abspath("export"))
     def _choose_output_folder(self) -> None:
         path = filedialog.askdirectory(initialdir=self.output_folder_var.get())
         if path:
             self.output_folder_var.set(path); self.out_label.config(text=path)
     def _toggle_batch_controls(self) -> None:
         enabled = self.enable_batch_var.get()
-        rows_state = "normal" if (enabled and self.batch_mode_var.get() == "rows") else "disabled"
+        rows_state = "normal" if enabled else "disabled"
         group_state = "readonly" if (enabled and self.batch_mode_var.get() == "group") else "disabled"
         self.rows_entry.configure(state=rows_state); self.group_combo.configure(state=group_state)
     def _on_mode_change(self) -> None: self._toggle_batch_controls()
@@ -332,8 +683,7 @@ class App:
         if file_path.lower().endswith(".csv"):
             try:
                 with open(file_path, newline="", encoding="utf-8-sig") as f:
-                    rdr = csv.DictReader(f)
-                    self.headers = [(h or "").strip().lower() for h in (rdr.fieldnames or [])]
+                    self.headers = [(h or "").strip().lower() for h in next(csv.reader(f), [])]
                     self._update_group_columns(self.headers)
             except Exception: pass
         else:
@@ -364,22 +714,18 @@ class App:
         self.last_valid_docs, self.last_errors, self.last_warnings = valid_docs, errors, warnings
         self.preview_box.config(state="normal")
         self.preview_box.delete("1.0", tk.END)
-        self.preview_box.insert(tk.END, "postCode,sku,price,\n", ("head",))
-        for doc in valid_docs[:100]:
-            line = f"{doc['postCode']},{doc['sku']},{doc['price']},\n"
-            self.preview_box.insert(tk.END, line, ("good",))
+        body = "".join(f"{pc},{sku},{price},\n" for pc, sku, price in islice(zip(valid_docs["postCode"], valid_docs["sku"], valid_docs["price"]), 100))
+        self.preview_box.insert(tk.END, "postCode,sku,price,\n", ("head",), body, ("good",))
         self.preview_box.config(state="disabled")
-        total_rows_est = len(valid_docs) + len(errors)
+        n_valid = len(valid_docs["sku"])
+        total_rows_est = n_valid + len(errors)
         dup_count = sum(1 for e in errors if "Duplicate id" in e.get("error", ""))
-        uniq_skus = len({d["sku"] for d in valid_docs})
-        prices = [d["price"] for d in valid_docs]
-        pmin = min(prices) if prices else None
-        pmax = max(prices) if prices else None
-        pavg = round(mean(prices), 6) if prices else None
+        uniq_skus = len(set(valid_docs["sku"]))
+        pmin, pmax, pavg = price_stats(valid_docs["price"])
         warn_count = len(warnings)
         self.cached_stats = {
             "rows_total": total_rows_est,
-            "rows_valid": len(valid_docs),
+            "rows_valid": n_valid,
             "rows_invalid": len(errors),
             "duplicates": dup_count,
             "unique_skus": uniq_skus,
@@ -390,13 +736,14 @@ class App:
         }
         self.stats_box.config(state="normal")
         self.stats_box.delete("1.0", tk.END)
+        chunks: list = []
         def put(line: str, tag: Optional[str] = None):
-            """Insert a line into stats_box with optional tag."""
-            self.stats_box.insert(tk.END, f"{line}\n", (tag,) if tag else ())
+            """Queue a line for stats_box with optional tag."""
+            chunks.extend((f"{line}\n", (tag,) if tag else ()))
         fmt = lambda n: f"{n:,}"
         put("Rows:", "head")
         put(f"  Estimated: {fmt(total_rows_est)}", "good" if total_rows_est > 0 else "bad")
-        put(f"  Valid: {fmt(len(valid_docs))}", "good" if len(valid_docs) > 0 else "bad")
+        put(f"  Valid: {fmt(n_valid)}", "good" if n_valid > 0 else "bad")
         put(f"  Invalid: {fmt(len(errors))}", "bad" if len(errors) > 0 else "good")
         put("\nData Quality:", "head")
         put(f"  Duplicates: {fmt(dup_count)}", "bad" if dup_count > 0 else "good")
@@ -411,117 +758,106 @@ class App:
         put("\nWarnings:", "head")
         put(f"  Count: {fmt(warn_count)}", "bad" if warn_count > 0 else "good")
         if errors:
-            self.stats_box.insert(tk.END, "\nIssues (first 50):\n", ("bad",))
-            for e in errors[:50]:
-                row = e.get("row", "N/A")
-                context = e.get("context", "")
-                error_msg = e.get("error", "")
-                self.stats_box.insert(tk.END, f"Row {row}: {context} -> {error_msg}\n", ("bad",))
+            issues = "".join(f"Row {e.get('row', 'N/A')}: {e.get('context', '')} -> {e.get('error', '')}\n" for e in errors[:50])
+            chunks.extend(("\nIssues (first 50):\n" + issues, ("bad",)))
+        self.stats_box.insert(tk.END, *chunks)
         self.stats_box.config(state="disabled")
     def export_files(self) -> None:
-        if not self.last_valid_docs and not self.last_errors: self.preview_data()
-        if not self.last_valid_docs and self.last_errors:
+        if not self.last_valid_docs["sku"] and not self.last_errors: self.preview_data()
+        docs = self.last_valid_docs
+        if not docs["sku"] and self.last_errors:
             messagebox.showerror("Error", "No valid rows to export (all invalid)."); return
-        csv_rows = [{"postCode": d["postCode"].lstrip("0") if d["postCode"] else "","sku": d["sku"], "price": d["price"]} for d in self.last_valid_docs]
-        json_rows = [{"postCode": d["postCode"], "sku": d["sku"], "price": d["price"]} for d in self.last_valid_docs]
         base_name = os.path.splitext(os.path.basename(self.file_path or 'pasted'))[0]
         base_name_snake = base_name.lower().replace("-", "_").replace(" ", "_")
         export_folder = self.output_folder_var.get().strip() or os.path.abspath("export")
         os.makedirs(export_folder, exist_ok=True)
-        if self.enable_batch_var.get():
-            mode = self.batch_mode_var.get()
-            if mode == "rows":
+        tmpl, tmpl_fields = _path_template(self._filename_pattern(), export_folder, base_name_snake, datetime.now().strftime("%Y%m%d_%H%M%S"))
+        sink = _BackgroundWriter(use_mmap=bool(self.mmap_var.get()))
+        try:
+            if self.enable_batch_var.get():
+                mode = self.batch_mode_var.get()
                 try: chunk = max(1, int(self.rows_per_file_var.get()))
                 except Exception: chunk = 1000
-                self._export_by_rows(export_folder, base_name_snake, csv_rows, json_rows, chunk)
+                if mode == "rows":
+                    self._export_by_rows(sink, tmpl, docs, chunk)
+                else:
+                    group_col = (self.group_column_var.get() or "").strip()
+                    self._export_by_group(sink, tmpl, docs, group_col, chunk, "part" in tmpl_fields)
             else:
-                group_col = (self.group_column_var.get() or "").strip()
-                self._export_by_group(export_folder, base_name_snake, json_rows, csv_rows, group_col)
-        else:
-            self._export_single(export_folder, base_name_snake, csv_rows, json_rows)
+                self._export_single(sink, tmpl, docs)
+        finally: sink.close()
         if self.last_errors:
             error_path = os.path.join(export_folder, f"{base_name_snake}_errors.csv")
             try:
-                with open(error_path, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=["row", "context", "error"])
-                    writer.writeheader(); writer.writerows(self.last_errors)
+                buf = io.StringIO(newline='')
+                writer = csv.DictWriter(buf, fieldnames=["row", "context", "error"])
+                writer.writeheader(); writer.writerows(self.last_errors)
+                with open(error_path, 'w', newline='', encoding='utf-8') as f: f.write(buf.getvalue())
             except Exception as e:
                 messagebox.showwarning("Warning", f"Failed to write error file:\n{e}")
         if self.open_folder_after_var.get():
             try: self._open_folder(export_folder)
             except Exception: pass
         messagebox.showinfo("Success", f"Export completed.\nFiles saved in:\n{export_folder}")
-    def _export_single(self, folder: str, base: str, csv_rows: list[dict], json_rows: list[dict]) -> None:
-        ts = self._ts()
-        if self.export_csv_var.get():
-            csv_path = self._render_path(folder, base, batch="all", group="all", ts=ts, ext="csv")
-            fields = ["postCode", "sku", "price"] 
-            with open(csv_path, 'w', newline='', encoding='utf-8') as f:
-                w = csv.DictWriter(f, fieldnames=fields); w.writeheader(); w.writerows(csv_rows)
-        if self.export_json_var.get():
-            json_path = self._render_path(folder, base, batch="all", group="all", ts=ts, ext="json")
-            with open(json_path, 'w', encoding='utf-8') as f: json.dump(json_rows, f, indent=4)
-    def _export_by_rows(self, folder: str, base: str, csv_rows: list[dict], json_rows: list[dict], chunk_size: int) -> None:
-        total = len(csv_rows)
+    def _export_single(self, sink: _BackgroundWriter, tmpl: str, docs: dict[str, Any]) -> None:
+        compress, indent = bool(self.compress_var.get()), bool(self.json_indent_var.get())
+        csv_path = _render_path(tmpl, batch="all", group="all", ext="csv") if self.export_csv_var.get() else None
+        json_path = _render_path(tmpl, batch="all", group="all", ext="json.gz" if compress else "json") if self.export_json_var.get() else None
+        _write_group(sink, csv_path, json_path, docs, compress, indent)
+    def _export_by_rows(self, sink: _BackgroundWriter, tmpl: str, docs: dict[str, Any], chunk_size: int) -> None:
+        total = len(docs["sku"])
         if total == 0: return
-        ts = self._ts(); parts = (total + chunk_size - 1) // chunk_size
-        fields = ["postCode", "sku", "price"]
+        parts = (total + chunk_size - 1) // chunk_size
+        compress, indent = bool(self.compress_var.get()), bool(self.json_indent_var.get())
+        csv_on, json_on = bool(self.export_csv_var.get()), bool(self.export_json_var.get())
         for i in range(parts):
             start, end = i * chunk_size, min((i+1) * chunk_size, total)
             batch_id = f"part{(i+1):03d}"
-            if self.export_csv_var.get():
-                path = self._render_path(folder, base, batch=batch_id, group="all", ts=ts, ext="csv")
-                with open(path, 'w', newline='', encoding='utf-8') as f:
-                    w = csv.DictWriter(f, fieldnames=fields); w.writeheader(); w.writerows(csv_rows[start:end])
-            if self.export_json_var.get():
-                path = self._render_path(folder, base, batch=batch_id, group="all", ts=ts, ext="json")
-                with open(path, 'w', encoding='utf-8') as f: json.dump(json_rows[start:end], f, indent=4)
-    def _export_by_group(self, folder: str, base: str, json_rows: list[dict], csv_rows: list[dict], group_col: str) -> None:
-        ts = self._ts(); key_lower = (group_col or "").lower()
-        def key_for_json(d: dict) -> str:
-            if key_lower in ("postcode", "post_code", "post code"): return d.get("postCode", "") or "UNK"
-            if key_lower == "sku": return d.get("sku", "") or "UNK"
-            if key_lower == "price": return str(d.get("price", "")) or "UNK"
-            return str(d.get(key_lower, "") or "UNK")
-        groups_json, groups_csv = defaultdict(list), defaultdict(list)
-        for j, c in zip(json_rows, csv_rows):
-            g = (key_for_json(j) or "UNK").strip() or "UNK"
-            groups_json[g].append(j); groups_csv[g].append(c)
-        fields = ["postCode", "sku", "price"]
-        for gval, rows_csv in groups_csv.items():
-            safe_group = self._sanitize_group(gval)
-            if self.export_csv_var.get():
-                path = self._render_path(folder, base, batch="group", group=safe_group, ts=ts, ext="csv")
-                with open(path, 'w', newline='', encoding='utf-8') as f:
-                    w = csv.DictWriter(f, fieldnames=fields); w.writeheader(); w.writerows(rows_csv)
-            if self.export_json_var.get():
-                rows_json = groups_json[gval]
-                path = self._render_path(folder, base, batch="group", group=safe_group, ts=ts, ext="json")
-                with open(path, 'w', encoding='utf-8') as f: json.dump(rows_json, f, indent=4)
+            csv_path = _render_path(tmpl, batch=batch_id, group="all", ext="csv") if csv_on else None
+            json_path = _render_path(tmpl, batch=batch_id, group="all", ext="json.gz" if compress else "json") if json_on else None
+            _write_group(sink, csv_path, json_path, {k: col[start:end] for k, col in docs.items()}, compress, indent)
+    def _export_by_group(self, sink: _BackgroundWriter, tmpl: str, docs: dict[str, Any], group_col: str, chunk_size: int, has_part: bool) -> None:
+        key_lower = (group_col or "").lower()
+        compress, indent = bool(self.compress_var.get()), bool(self.json_indent_var.get())
+        if key_lower in ("postcode", "post_code", "post code"): keys = [pc.strip() or "UNK" for pc in docs["postCode"]]
+        elif key_lower == "sku": keys = [sku.strip() or "UNK" for sku in docs["sku"]]
+        elif key_lower == "price": keys = [str(p) for p in docs["price"]]
+        else: keys = ["UNK"] * len(docs["sku"])
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        csv_on, json_on = bool(self.export_csv_var.get()), bool(self.export_json_var.get())
+        for gval, members in groupby(order, key=keys.__getitem__):
+            safe_group, members = _sanitize_group(gval), list(members)
+            split = len(members) > chunk_size
+            for p, start in enumerate(range(0, len(members), chunk_size), 1):
+                # Groups over rows_per_file are split into numbered parts; without a {part} token the number goes on the group
+                # name after "~", which _sanitize_group never emits, so a part can't collide with a real group's file.
+                part = f"{p:04d}" if split else ""
+                group = f"{safe_group}~{part}" if split and not has_part else safe_group
+                csv_path = _render_path(tmpl, batch="group", group=group, ext="csv", part=part) if csv_on else None
+                json_path = _render_path(tmpl, batch="group", group=group, ext="json.gz" if compress else "json", part=part) if json_on else None
+                _write_group(sink, csv_path, json_path, take_docs(docs, members[start:start + chunk_size]), compress, indent)
     def _save_all_settings(self, silent: bool = False) -> None:
-        self.settings["export"]["folder"] = self.output_folder_var.get().strip()
-        self.settings["export"]["open_folder_after"] = bool(self.open_folder_after_var.get())
-        self.settings["export"]["filename_pattern"] = self.filename_pattern_var.get().strip()
-        self.settings["export"]["formats"]["csv"] = bool(self.export_csv_var.get())
-        self.settings["export"]["formats"]["json"] = bool(self.export_json_var.get())
-        self.settings["batch"]["enabled"] = bool(self.enable_batch_var.get())
-        self.settings["batch"]["mode"] = self.batch_mode_var.get()
-        self.settings["batch"]["rows_per_file"] = int(self.rows_per_file_var.get() or 1000)
-        self.settings["batch"]["group_column"] = self.group_column_var.get().strip()
-        self._ensure_export_dir()
+        export, batch = self.settings["export"], self.settings["batch"]
+        folder = self.output_folder_var.get().strip()
+        export["folder"] = folder
+        export["open_folder_after"] = bool(self.open_folder_after_var.get())
+        export["filename_pattern"] = self.filename_pattern_var.get().strip()
+        export["formats"]["csv"] = bool(self.export_csv_var.get())
+        export["formats"]["json"] = bool(self.export_json_var.get())
+        export["compress"] = bool(self.compress_var.get())
+        export["json_indent"] = bool(self.json_indent_var.get())
+        export["mmap"] = bool(self.mmap_var.get())
+        batch["enabled"] = bool(self.enable_batch_var.get())
+        batch["mode"] = self.batch_mode_var.get()
+        batch["rows_per_file"] = int(self.rows_per_file_var.get() or 1000)
+        batch["group_column"] = self.group_column_var.get().strip()
+        self.output_folder_var.set(folder or os.path.abspath("export"))
         save_settings(self.settings)
         if not silent: messagebox.showinfo("Settings", "Settings saved.")
-    def _render_path(self, folder: str, base: str, batch: str, group: str, ts: str, ext: str) -> str:
-        pattern = (self.filename_pattern_var.get() or "{base}_{batch}_{group}_{ts}.{ext}").strip()
-        vals = {"base": base, "batch": batch, "group": group if group else "all", "ts": ts, "ext": ext.lstrip(".")}
-        return os.path.join(folder, pattern.format(**vals))
-    def _ts(self) -> str: return datetime.now().strftime("%Y%m%d_%H%M%S")
-    def _sanitize_group(self, s: str) -> str:
-        out = "".join(c if c.isalnum() or c in ("-", "_", ".") else "_" for c in s)
-        return out[:80] if out else "UNK"
+    def _filename_pattern(self) -> str: return (self.filename_pattern_var.get() or DEFAULT_FILENAME_PATTERN).strip()
     def _open_folder(self, path: str) -> None:
         sys = platform.system()
-        if sys == "Windows": subprocess.Popen(f'explorer "{path}"', shell=True)
+        if sys == "Windows": os.startfile(path)
         elif sys == "Darwin": subprocess.Popen(["open", path])
         else: subprocess.Popen(["xdg-open", path])
     def _choose_db_path(self) -> None: